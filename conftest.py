@@ -0,0 +1 @@
+# Permite importar los módulos de la raíz (deploy_settings, deploy_precompress) desde tests/
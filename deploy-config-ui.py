@@ -6,12 +6,17 @@ Usa CustomTkinter para una UI moderna y bonita
 
 import customtkinter as ctk
 import json
+import math
 import os
+import signal
 from pathlib import Path
+import tkinter as tk
 from tkinter import messagebox, filedialog
 import subprocess
 import sys
 
+from deploy_settings import SettingsStore, env_cache_file, watch_process_alive
+
 # Configuración de tema
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -21,7 +26,13 @@ class DeployConfigUI(ctk.CTk):
         super().__init__()
         
         self.config_file = Path(__file__).parent / "deploy-settings.json"
-        self.config_data = self.load_config()
+        self.store = SettingsStore(self.config_file)
+        self.current_env = (self.store.environment_names() or ["somee"])[0]
+        self._store_stamp = self.store.stamp()
+        self._filter_job = None
+        # Procesos en modo watch por entorno y último estado leído de disco
+        self.watch_processes = {}
+        self._watch_status = {}
         
         # Configuración de ventana
         self.title("🚀 Deploy Manager - IIS/Somee")
@@ -41,18 +52,9 @@ class DeployConfigUI(ctk.CTk):
         # Footer con botones
         self.create_footer()
         
-    def load_config(self):
-        """Carga la configuración desde deploy-settings.json"""
-        if self.config_file.exists():
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {"environments": {}}
-    
-    def save_config(self):
-        """Guarda la configuración en deploy-settings.json"""
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(self.config_data, f, indent=2, ensure_ascii=False)
-    
+        # Cambios de la otra UI y estado del modo watch (un par de stat por segundo)
+        self.poll_status()
+        
     def create_header(self):
         """Crea el header de la aplicación"""
         header_frame = ctk.CTkFrame(self, corner_radius=0, fg_color=("#3b8ed0", "#1f6aa5"))
@@ -96,13 +98,13 @@ class DeployConfigUI(ctk.CTk):
             font=ctk.CTkFont(size=14, weight="bold")
         ).pack(side="left", padx=10)
         
-        self.env_selector = ctk.CTkOptionMenu(
+        self.env_search_entry = ctk.CTkEntry(
             env_selector_frame,
-            values=list(self.config_data.get("environments", {}).keys()) or ["somee"],
-            command=self.on_env_change,
+            placeholder_text="🔎 Buscar entorno...",
             width=200
         )
-        self.env_selector.pack(side="left", padx=10)
+        self.env_search_entry.pack(side="left", padx=10)
+        self.env_search_entry.bind("<KeyRelease>", self.on_env_filter)
         
         add_env_btn = ctk.CTkButton(
             env_selector_frame,
@@ -122,19 +124,47 @@ class DeployConfigUI(ctk.CTk):
         )
         delete_env_btn.pack(side="left", padx=10)
         
+        # Lista de entornos (un único Listbox: escala a cientos de entornos)
+        env_list_frame = ctk.CTkFrame(self.scroll_frame)
+        env_list_frame.grid(row=1, column=0, columnspan=2, sticky="ew", padx=10, pady=(0, 10))
+        env_list_frame.grid_columnconfigure(0, weight=1)
+        
+        self.env_listbox = tk.Listbox(
+            env_list_frame,
+            height=6,
+            activestyle="none",
+            exportselection=False,
+            borderwidth=0,
+            highlightthickness=0,
+            font=("Segoe UI", 11),
+            bg="#2b2b2b",
+            fg="#DCE4EE",
+            selectbackground="#1f6aa5",
+            selectforeground="white"
+        )
+        self.env_listbox.grid(row=0, column=0, sticky="ew", padx=(10, 0), pady=10)
+        self.env_listbox.bind("<<ListboxSelect>>", self.on_env_select)
+        
+        env_scrollbar = ctk.CTkScrollbar(env_list_frame, command=self.env_listbox.yview)
+        env_scrollbar.grid(row=0, column=1, sticky="ns", padx=(0, 5), pady=10)
+        self.env_listbox.configure(yscrollcommand=env_scrollbar.set)
+        
+        self.refresh_env_list()
+        
         # Separador
         separator = ctk.CTkFrame(self.scroll_frame, height=2, fg_color=("#cccccc", "#333333"))
-        separator.grid(row=1, column=0, columnspan=2, sticky="ew", padx=10, pady=10)
+        separator.grid(row=2, column=0, columnspan=2, sticky="ew", padx=10, pady=10)
         
         # Campos de configuración
         self.create_config_fields()
         
     def create_config_fields(self):
-        """Crea los campos de configuración"""
-        current_env = self.env_selector.get()
-        env_config = self.config_data.get("environments", {}).get(current_env, {})
+        """Crea los campos de configuración (una sola vez; se reutilizan al cambiar de entorno)"""
+        env_config = self.store.get_environment(self.current_env)
+        # Lo último cargado en el formulario: para distinguir las ediciones del usuario
+        self._loaded_config = (env_config, self.store.get_section("bandwidth"))
         
-        row = 2
+        row = 3
         
         # Directorio de Publicación
         ctk.CTkLabel(
@@ -222,6 +252,82 @@ class DeployConfigUI(ctk.CTk):
         
         row += 2
         
+        # Opciones de deployment
+        self.precompress_var = ctk.BooleanVar(value=bool(env_config.get("precompress", False)))
+        ctk.CTkCheckBox(
+            self.scroll_frame,
+            text="🗜️ Precomprimir estáticos de wwwroot (.gz/.br)",
+            variable=self.precompress_var,
+            font=ctk.CTkFont(size=13)
+        ).grid(row=row, column=0, columnspan=2, sticky="w", padx=20, pady=(0, 10))
+        
+        row += 1
+        
+        watch_frame = ctk.CTkFrame(self.scroll_frame, fg_color="transparent")
+        watch_frame.grid(row=row, column=0, columnspan=2, sticky="ew", padx=20, pady=(0, 10))
+        
+        self.watch_var = ctk.BooleanVar(value=bool(env_config.get("watch", False)))
+        ctk.CTkCheckBox(
+            watch_frame,
+            text="👁️ Modo watch (sincroniza cada cambio de publishDir)",
+            variable=self.watch_var,
+            font=ctk.CTkFont(size=13)
+        ).pack(side="left")
+        
+        self.stop_watch_btn = ctk.CTkButton(
+            watch_frame,
+            text="⏹ Detener watch",
+            command=self.stop_watch,
+            width=130,
+            state="disabled",
+            fg_color=("gray70", "gray30")
+        )
+        self.stop_watch_btn.pack(side="right")
+        
+        self.watch_status_label = ctk.CTkLabel(
+            watch_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            anchor="e"
+        )
+        self.watch_status_label.pack(side="right", padx=10)
+        
+        row += 1
+        
+        # Límites de subida (se aplican en vivo a los deployments en curso)
+        ctk.CTkLabel(
+            self.scroll_frame,
+            text="🚦 Límite de subida (KB/s, 0 = sin límite):",
+            font=ctk.CTkFont(size=13, weight="bold"),
+            anchor="w"
+        ).grid(row=row, column=0, sticky="w", padx=20, pady=(10, 5))
+        
+        bandwidth_frame = ctk.CTkFrame(self.scroll_frame, fg_color="transparent")
+        bandwidth_frame.grid(row=row+1, column=0, columnspan=2, sticky="ew", padx=20, pady=(0, 15))
+        
+        ctk.CTkLabel(bandwidth_frame, text="Entorno:").pack(side="left", padx=(0, 5))
+        self.env_rate_entry = ctk.CTkEntry(bandwidth_frame, placeholder_text="0", width=100, height=40)
+        self.env_rate_entry.pack(side="left", padx=(0, 15))
+        self.env_rate_entry.insert(0, self._format_rate(env_config.get("maxUploadBytesPerSec")))
+        
+        ctk.CTkLabel(bandwidth_frame, text="Global (todos los deployments):").pack(side="left", padx=(0, 5))
+        self.global_rate_entry = ctk.CTkEntry(bandwidth_frame, placeholder_text="0", width=100, height=40)
+        self.global_rate_entry.pack(side="left", padx=(0, 15))
+        self.global_rate_entry.insert(
+            0, self._format_rate(self.store.get_section("bandwidth").get("maxUploadBytesPerSec"))
+        )
+        
+        ctk.CTkButton(
+            bandwidth_frame,
+            text="⚡ Aplicar",
+            command=self.apply_bandwidth_limits,
+            width=100,
+            height=40,
+            fg_color=("#3b8ed0", "#1f6aa5")
+        ).pack(side="left")
+        
+        row += 2
+        
         # Info box
         info_frame = ctk.CTkFrame(self.scroll_frame, fg_color=("#E3F2FD", "#1E3A5F"))
         info_frame.grid(row=row, column=0, columnspan=2, sticky="ew", padx=20, pady=20)
@@ -242,14 +348,113 @@ class DeployConfigUI(ctk.CTk):
             anchor="w"
         ).pack(padx=15, pady=15, fill="both")
     
+    def refresh_env_list(self):
+        """Rellena la lista con los entornos que coinciden con el filtro"""
+        self._filter_job = None
+        query = self.env_search_entry.get().strip().lower()
+        names = self.store.environment_names() or ["somee"]
+        if query:
+            names = [name for name in names if query in name.lower()]
+        
+        self.env_listbox.delete(0, "end")
+        if names:
+            self.env_listbox.insert("end", *names)
+        if self.current_env in names:
+            index = names.index(self.current_env)
+            self.env_listbox.selection_set(index)
+            self.env_listbox.see(index)
+    
+    def on_env_filter(self, event=None):
+        """Aplica el filtro de búsqueda con un pequeño debounce"""
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(150, self.refresh_env_list)
+    
+    def on_env_select(self, event=None):
+        """Cambia al entorno seleccionado en la lista"""
+        selection = self.env_listbox.curselection()
+        if selection:
+            self.on_env_change(self.env_listbox.get(selection[0]))
+    
     def on_env_change(self, choice):
         """Actualiza los campos al cambiar de entorno"""
-        # Limpiar campos actuales
-        for widget in self.scroll_frame.winfo_children()[3:]:  # Mantener selector y separador
-            widget.destroy()
+        self.current_env = choice
+        self._fill_form(self.store.get_environment(choice), self.store.get_section("bandwidth"))
+        self.update_watch_status()
+    
+    def _form_fields(self, env_config, bandwidth):
+        """(widget o variable, valor que muestra) para cada campo del formulario"""
+        return [
+            (self.publish_dir_entry, str(env_config.get("publishDir", ""))),
+            (self.ftp_host_entry, str(env_config.get("ftpHost", ""))),
+            (self.ftp_user_entry, str(env_config.get("ftpUser", ""))),
+            (self.remote_root_entry, str(env_config.get("remoteRoot", ""))),
+            (self.precompress_var, bool(env_config.get("precompress", False))),
+            (self.watch_var, bool(env_config.get("watch", False))),
+            (self.env_rate_entry, self._format_rate(env_config.get("maxUploadBytesPerSec"))),
+            (self.global_rate_entry, self._format_rate(bandwidth.get("maxUploadBytesPerSec")))
+        ]
+    
+    def _fill_form(self, env_config, bandwidth, previous=None):
+        """Rellena el formulario reutilizando los widgets
         
-        # Recrear campos con nueva configuración
-        self.create_config_fields()
+        Con previous (lo cargado antes) solo se tocan los campos que el
+        usuario no ha editado, para no perder cambios sin guardar.
+        """
+        shown = [value for _, value in self._form_fields(*previous)] if previous else None
+        for index, (field, value) in enumerate(self._form_fields(env_config, bandwidth)):
+            if shown is not None and field.get() != shown[index]:
+                continue
+            if isinstance(field, tk.Variable):
+                field.set(value)
+            else:
+                field.delete(0, "end")
+                field.insert(0, value)
+        self._loaded_config = (env_config, bandwidth)
+    
+    def _mark_saved(self):
+        """Tras una escritura propia: que el siguiente tick no la tome por externa"""
+        self._store_stamp = self.store.stamp()
+        self._loaded_config = (
+            self.store.get_environment(self.current_env),
+            self.store.get_section("bandwidth")
+        )
+    
+    @staticmethod
+    def _format_rate(bytes_per_sec):
+        """Bytes/s guardados -> texto en KB/s para el formulario"""
+        if not bytes_per_sec:
+            return "0"
+        return f"{bytes_per_sec / 1024:g}"
+    
+    @staticmethod
+    def _parse_rate(text):
+        """Texto en KB/s -> bytes/s (0 = sin límite); ValueError si no es válido"""
+        kb_per_sec = float(text.strip().replace(",", ".") or 0)
+        if not math.isfinite(kb_per_sec):
+            raise ValueError("el límite debe ser un número finito")
+        if kb_per_sec < 0:
+            raise ValueError("el límite no puede ser negativo")
+        return int(kb_per_sec * 1024)
+    
+    def apply_bandwidth_limits(self):
+        """Guarda solo los límites de subida; los deployments en curso los releen"""
+        try:
+            env_rate = self._parse_rate(self.env_rate_entry.get())
+            global_rate = self._parse_rate(self.global_rate_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Límite de subida inválido: {str(e)}")
+            return
+        
+        try:
+            self.store.update_environment(self.current_env, {"maxUploadBytesPerSec": env_rate})
+            self.store.update_section("bandwidth", {"maxUploadBytesPerSec": global_rate})
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo guardar: {str(e)}")
+            return
+        self._mark_saved()
+        
+        messagebox.showinfo("Éxito", "✅ Límites de subida aplicados")
     
     def browse_publish_dir(self):
         """Abre el diálogo para seleccionar directorio de publicación"""
@@ -273,33 +478,35 @@ class DeployConfigUI(ctk.CTk):
         env_name = dialog.get_input()
         
         if env_name:
-            if env_name in self.config_data.get("environments", {}):
+            if env_name in self.store.environment_names():
                 messagebox.showwarning("Advertencia", f"El entorno '{env_name}' ya existe")
                 return
             
             # Crear nuevo entorno con valores por defecto
-            if "environments" not in self.config_data:
-                self.config_data["environments"] = {}
-            
-            self.config_data["environments"][env_name] = {
-                "publishDir": "",
-                "ftpHost": "ftp.example.com",
-                "ftpUser": "usuario",
-                "remoteRoot": "/site/wwwroot"
-            }
+            try:
+                self.store.update_environment(env_name, {
+                    "publishDir": "",
+                    "ftpHost": "ftp.example.com",
+                    "ftpUser": "usuario",
+                    "remoteRoot": "/site/wwwroot"
+                })
+            except Exception as e:
+                messagebox.showerror("Error", f"No se pudo crear el entorno: {str(e)}")
+                return
+            self._store_stamp = self.store.stamp()
             
-            # Actualizar selector
-            self.env_selector.configure(values=list(self.config_data["environments"].keys()))
-            self.env_selector.set(env_name)
+            # Actualizar lista
+            self.env_search_entry.delete(0, "end")
             self.on_env_change(env_name)
+            self.refresh_env_list()
             
             messagebox.showinfo("Éxito", f"Entorno '{env_name}' creado")
     
     def delete_environment(self):
         """Elimina el entorno actual"""
-        current_env = self.env_selector.get()
+        current_env = self.current_env
         
-        if len(self.config_data.get("environments", {})) <= 1:
+        if len(self.store.environment_names()) <= 1:
             messagebox.showwarning("Advertencia", "Debe existir al menos un entorno")
             return
         
@@ -309,13 +516,17 @@ class DeployConfigUI(ctk.CTk):
         )
         
         if result:
-            del self.config_data["environments"][current_env]
+            try:
+                self.store.delete_environment(current_env)
+            except Exception as e:
+                messagebox.showerror("Error", f"No se pudo eliminar: {str(e)}")
+                return
+            self._store_stamp = self.store.stamp()
             
-            # Actualizar selector
-            remaining_envs = list(self.config_data["environments"].keys())
-            self.env_selector.configure(values=remaining_envs)
-            self.env_selector.set(remaining_envs[0])
+            # Actualizar lista
+            remaining_envs = self.store.environment_names()
             self.on_env_change(remaining_envs[0])
+            self.refresh_env_list()
             
             messagebox.showinfo("Éxito", f"Entorno '{current_env}' eliminado")
     
@@ -362,10 +573,9 @@ class DeployConfigUI(ctk.CTk):
     
     def save_changes(self):
         """Guarda los cambios en la configuración"""
-        current_env = self.env_selector.get()
+        current_env = self.current_env
         
-        # Actualizar datos
-        self.config_data["environments"][current_env] = {
+        env_config = {
             "publishDir": self.publish_dir_entry.get().strip(),
             "ftpHost": self.ftp_host_entry.get().strip(),
             "ftpUser": self.ftp_user_entry.get().strip(),
@@ -373,17 +583,22 @@ class DeployConfigUI(ctk.CTk):
         }
         
         # Validar campos
-        if not all([
-            self.config_data["environments"][current_env]["publishDir"],
-            self.config_data["environments"][current_env]["ftpHost"],
-            self.config_data["environments"][current_env]["ftpUser"],
-            self.config_data["environments"][current_env]["remoteRoot"]
-        ]):
+        if not all(env_config.values()):
             messagebox.showerror("Error", "Todos los campos son obligatorios")
             return
         
+        env_config["precompress"] = self.precompress_var.get()
+        env_config["watch"] = self.watch_var.get()
+        
+        try:
+            env_config["maxUploadBytesPerSec"] = self._parse_rate(self.env_rate_entry.get())
+            global_rate = self._parse_rate(self.global_rate_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Límite de subida inválido: {str(e)}")
+            return
+        
         # Validar que el directorio existe
-        publish_dir = self.config_data["environments"][current_env]["publishDir"]
+        publish_dir = env_config["publishDir"]
         if not os.path.exists(publish_dir):
             result = messagebox.askyesno(
                 "Advertencia",
@@ -393,18 +608,25 @@ class DeployConfigUI(ctk.CTk):
                 return
         
         try:
-            self.save_config()
+            self.store.update_environment(current_env, env_config)
+            self.store.update_section("bandwidth", {"maxUploadBytesPerSec": global_rate})
+            self._mark_saved()
             messagebox.showinfo("Éxito", "✅ Configuración guardada correctamente")
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo guardar: {str(e)}")
     
     def run_deployment(self):
         """Ejecuta el proceso de deployment"""
-        current_env = self.env_selector.get()
+        current_env = self.current_env
         
         # Primero guardar cambios
         self.save_changes()
         
+        watch_mode = bool(self.store.get_environment(current_env).get("watch"))
+        if watch_mode and self._watch_running(current_env):
+            messagebox.showwarning("Advertencia", f"El modo watch ya está activo en '{current_env}'")
+            return
+        
         # Pedir contraseña
         password_dialog = ctk.CTkInputDialog(
             text=f"Contraseña FTP para '{current_env}':",
@@ -424,31 +646,161 @@ class DeployConfigUI(ctk.CTk):
         )
         
         if result:
-            messagebox.showinfo(
-                "Deployment Iniciado",
-                "El deployment se ejecutará en VS Code.\n"
-                "Revisa la terminal para ver el progreso."
-            )
-            
-            # Aquí podrías ejecutar el script PowerShell directamente
-            # Por ahora solo mostramos el mensaje
-            self.withdraw()
+            if watch_mode:
+                messagebox.showinfo(
+                    "Modo Watch Iniciado",
+                    "Tras la subida inicial, cada cambio en publishDir se\n"
+                    "sincronizará automáticamente.\n\n"
+                    "La latencia de la última sincronización se muestra aquí."
+                )
+            else:
+                messagebox.showinfo(
+                    "Deployment Iniciado",
+                    "El deployment se ejecutará en una terminal.\n"
+                    "Revisa la terminal para ver el progreso.\n\n"
+                    "Puedes ajustar el límite de subida mientras corre."
+                )
             
+            # La ventana sigue abierta para poder ajustar los límites en vivo
             try:
                 script_path = Path(__file__).parent / "deploy-somee.ps1"
-                publish_dir = self.config_data["environments"][current_env]["publishDir"]
+                publish_dir = self.store.get_environment(current_env)["publishDir"]
                 
-                subprocess.Popen([
+                command = [
                     "powershell",
                     "-ExecutionPolicy", "Bypass",
                     "-File", str(script_path),
                     "-publishDir", publish_dir,
                     "-Env", current_env,
                     "-Password", password
-                ], shell=True)
+                ]
+                if watch_mode:
+                    # Sin shell para conservar el proceso real y poder detenerlo
+                    command.append("-Watch")
+                    # Descartar el estado de una ejecución anterior
+                    for stale_file in (env_cache_file("watch", current_env),
+                                       env_cache_file("watch", current_env, ".stop")):
+                        if stale_file.exists():
+                            stale_file.unlink()
+                    self._watch_status.pop(current_env, None)
+                    self.watch_processes[current_env] = subprocess.Popen(
+                        command,
+                        creationflags=getattr(subprocess, "CREATE_NEW_CONSOLE", 0)
+                    )
+                    self.update_watch_status()
+                else:
+                    subprocess.Popen(command, shell=True)
             except Exception as e:
                 messagebox.showerror("Error", f"Error al ejecutar deployment: {str(e)}")
-                self.deiconify()
+    
+    def _watch_running(self, env_name):
+        process = self.watch_processes.get(env_name)
+        if process is not None and process.poll() is not None:
+            del self.watch_processes[env_name]
+            process = None
+        if process is not None:
+            return True
+        # Lanzado antes de reiniciar la UI: vale el pid del archivo de estado
+        return watch_process_alive(self._read_watch_status(env_name))
+    
+    def _read_watch_status(self, env_name):
+        """Lee watch-<env>.json solo si cambió desde la última lectura"""
+        status_file = env_cache_file("watch", env_name)
+        try:
+            mtime = status_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._watch_status.get(env_name)
+        if cached is None or cached[0] != mtime:
+            try:
+                with open(status_file, 'r', encoding='utf-8-sig') as f:
+                    cached = (mtime, json.load(f))
+            except (OSError, ValueError):
+                return cached[1] if cached else None
+            self._watch_status[env_name] = cached
+        return cached[1]
+    
+    def update_watch_status(self):
+        """Muestra el estado del modo watch del entorno actual"""
+        running = self._watch_running(self.current_env)
+        status = self._read_watch_status(self.current_env) if running else None
+        
+        if not running:
+            text = ""
+        elif not status or status.get("state") == "starting":
+            text = "⏳ Subida inicial..."
+        elif status.get("lastSyncLatencyMs") is None:
+            text = f"👁️ Vigilando ({status.get('mode')})"
+        else:
+            text = (
+                f"🔄 Última sync: {status['lastSyncLatencyMs'] / 1000:.1f} s "
+                f"({status.get('lastSyncFiles', 0)} archivos)"
+            )
+            if status.get("lastSyncErrors"):
+                text += f" ⚠️ {status['lastSyncErrors']} errores"
+        
+        self.watch_status_label.configure(text=text)
+        self.stop_watch_btn.configure(state="normal" if running else "disabled")
+    
+    def check_external_changes(self):
+        """Recarga lista y formulario si deploy-settings.json cambió en disco"""
+        stamp = self.store.stamp()
+        if stamp == self._store_stamp:
+            return
+        self._store_stamp = stamp
+        
+        try:
+            names = self.store.environment_names()
+            env_config = self.store.get_environment(self.current_env)
+            bandwidth = self.store.get_section("bandwidth")
+        except (OSError, ValueError):
+            # JSON a medio editar a mano: se conserva lo último válido hasta
+            # que el archivo vuelva a cambiar
+            return
+        
+        if names and self.current_env not in names:
+            self.on_env_change(names[0])
+        elif (env_config, bandwidth) != self._loaded_config:
+            self._fill_form(env_config, bandwidth, previous=self._loaded_config)
+        self.refresh_env_list()
+    
+    def poll_status(self):
+        """Refresca cada segundo los cambios externos y el estado del watch"""
+        try:
+            self.check_external_changes()
+            self.update_watch_status()
+        finally:
+            self.after(1000, self.poll_status)
+    
+    def stop_watch(self):
+        """Pide al modo watch del entorno actual que se detenga"""
+        env_name = self.current_env
+        if not self._watch_running(env_name):
+            return
+        
+        # El script revisa el archivo .stop cada segundo y cierra limpiamente
+        stop_file = env_cache_file("watch", env_name, ".stop")
+        stop_file.parent.mkdir(parents=True, exist_ok=True)
+        stop_file.touch()
+        self.watch_status_label.configure(text="⏹ Deteniendo...")
+        # Se fija ahora a qué proceso se pidió parar: en estos 10 s puede
+        # haberse detenido y arrancado otro watch del mismo entorno
+        process = self.watch_processes.get(env_name)
+        pid = None if process is not None else self._read_watch_status(env_name).get("pid")
+        self.after(10000, lambda: self._terminate_watch(env_name, process, pid))
+    
+    def _terminate_watch(self, env_name, process, pid):
+        """Último recurso si el modo watch no atendió el archivo .stop"""
+        if process is not None:
+            if process.poll() is None:
+                process.terminate()
+            return
+        status = self._read_watch_status(env_name)
+        if watch_process_alive(status) and status.get("pid") == pid:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
 
 def main():
     """Función principal"""
@@ -8,6 +8,8 @@ import json
 from pathlib import Path
 import subprocess
 
+from deploy_settings import SettingsStore, env_cache_file, watch_process_alive
+
 # Configuración de la página
 st.set_page_config(
     page_title="Deploy Manager",
@@ -50,45 +52,46 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Funciones auxiliares
-@st.cache_data
-def load_config():
-    """Carga la configuración desde deploy-settings.json"""
-    config_file = Path(__file__).parent / "deploy-settings.json"
-    if config_file.exists():
-        with open(config_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {"environments": {}}
-
-def save_config(config_data):
-    """Guarda la configuración en deploy-settings.json"""
-    config_file = Path(__file__).parent / "deploy-settings.json"
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump(config_data, f, indent=2, ensure_ascii=False)
-    st.cache_data.clear()
+@st.cache_resource
+def get_store():
+    """Almacén compartido de deploy-settings.json (caché validada por mtime)"""
+    return SettingsStore(Path(__file__).parent / "deploy-settings.json")
 
-# Cargar configuración
-config_data = load_config()
+store = get_store()
 
 # Sidebar - Gestión de entornos
 with st.sidebar:
     st.header("📋 Entornos")
     
     # Lista de entornos
-    environments = list(config_data.get("environments", {}).keys())
+    environments = store.environment_names()
     if not environments:
-        environments = ["somee"]
-        if "environments" not in config_data:
-            config_data["environments"] = {}
-        config_data["environments"]["somee"] = {
+        store.update_environment("somee", {
             "ftpHost": "ftp.somee.com",
             "ftpUser": "MI_USUARIO_FTP",
             "remoteRoot": "/site/wwwroot"
-        }
-        save_config(config_data)
+        })
+        environments = store.environment_names()
+    
+    env_filter = st.text_input(
+        "🔎 Buscar entorno:",
+        key="env_filter",
+        placeholder="Filtrar por nombre"
+    )
+    filtered_envs = environments
+    if env_filter.strip():
+        query = env_filter.strip().lower()
+        filtered_envs = [name for name in environments if query in name.lower()]
+        # Mantener visible el entorno actual aunque no coincida con el filtro
+        current = st.session_state.get("env_selector")
+        if current in environments and current not in filtered_envs:
+            filtered_envs = [current] + filtered_envs
+    
+    st.caption(f"{len(filtered_envs)} de {len(environments)} entornos")
     
     selected_env = st.selectbox(
         "Selecciona entorno:",
-        environments,
+        filtered_envs,
         key="env_selector"
     )
     
@@ -99,15 +102,14 @@ with st.sidebar:
         new_env_name = st.text_input("Nombre del entorno:", key="new_env_name")
         if st.button("Crear", key="create_env"):
             if new_env_name:
-                if new_env_name in config_data["environments"]:
+                if new_env_name in environments:
                     st.error(f"El entorno '{new_env_name}' ya existe")
                 else:
-                    config_data["environments"][new_env_name] = {
+                    store.update_environment(new_env_name, {
                         "ftpHost": "ftp.example.com",
                         "ftpUser": "usuario",
                         "remoteRoot": "/site/wwwroot"
-                    }
-                    save_config(config_data)
+                    })
                     st.success(f"✅ Entorno '{new_env_name}' creado")
                     st.rerun()
             else:
@@ -117,8 +119,7 @@ with st.sidebar:
     if len(environments) > 1:
         st.divider()
         if st.button("🗑️ Eliminar Entorno Actual", type="secondary"):
-            del config_data["environments"][selected_env]
-            save_config(config_data)
+            store.delete_environment(selected_env)
             st.success(f"✅ Entorno '{selected_env}' eliminado")
             st.rerun()
     
@@ -133,8 +134,8 @@ with st.sidebar:
     """)
 
 # Main content - Configuración del entorno seleccionado
-if selected_env in config_data.get("environments", {}):
-    env_config = config_data["environments"][selected_env]
+if selected_env in environments:
+    env_config = store.get_environment(selected_env)
     
     st.header(f"⚙️ Configuración de '{selected_env}'")
     
@@ -171,6 +172,18 @@ if selected_env in config_data.get("environments", {}):
                 label_visibility="collapsed"
             )
             
+            precompress = st.checkbox(
+                "🗜️ Precomprimir estáticos de wwwroot (.gz/.br)",
+                value=bool(env_config.get("precompress", False)),
+                help="Genera .gz/.br en paralelo y solo sube los artefactos que cambiaron"
+            )
+            
+            watch = st.checkbox(
+                "👁️ Modo watch (sincroniza cada cambio de publishDir)",
+                value=bool(env_config.get("watch", False)),
+                help="Se inicia desde la interfaz de escritorio o con -Watch en deploy-somee.ps1"
+            )
+            
             st.markdown("<br>", unsafe_allow_html=True)
             st.markdown("""
             <div class="info-box">
@@ -191,20 +204,73 @@ if selected_env in config_data.get("environments", {}):
             if not all([ftp_host, ftp_user, remote_root]):
                 st.error("❌ Todos los campos son obligatorios")
             else:
-                config_data["environments"][selected_env] = {
+                store.update_environment(selected_env, {
                     "ftpHost": ftp_host.strip(),
                     "ftpUser": ftp_user.strip(),
-                    "remoteRoot": remote_root.strip()
-                }
-                save_config(config_data)
+                    "remoteRoot": remote_root.strip(),
+                    "precompress": precompress,
+                    "watch": watch
+                })
                 st.success("✅ Configuración guardada correctamente")
                 st.balloons()
     
     st.divider()
     
+    # Límites de subida: se guardan al instante y los deployments en curso
+    # los releen de deploy-settings.json en menos de un segundo
+    st.header("🚦 Límite de subida")
+    bandwidth_config = store.get_section("bandwidth")
+    
+    col1, col2, col3 = st.columns([1, 1, 1])
+    
+    with col1:
+        env_rate_kb = st.number_input(
+            f"Entorno '{selected_env}' (KB/s)",
+            min_value=0.0,
+            value=float(env_config.get("maxUploadBytesPerSec") or 0) / 1024,
+            step=128.0,
+            help="0 = sin límite"
+        )
+    
+    with col2:
+        global_rate_kb = st.number_input(
+            "Global, repartido entre deployments simultáneos (KB/s)",
+            min_value=0.0,
+            value=float(bandwidth_config.get("maxUploadBytesPerSec") or 0) / 1024,
+            step=128.0,
+            help="0 = sin límite"
+        )
+    
+    with col3:
+        st.markdown("<br>", unsafe_allow_html=True)
+        if st.button("⚡ Aplicar límites"):
+            store.update_environment(selected_env, {"maxUploadBytesPerSec": int(env_rate_kb * 1024)})
+            store.update_section("bandwidth", {"maxUploadBytesPerSec": int(global_rate_kb * 1024)})
+            st.success("✅ Límites aplicados")
+    
+    st.divider()
+    
     # Sección de deployment
     st.header("🚀 Ejecutar Deployment")
     
+    # Estado del modo watch (lo escribe deploy-somee.ps1 -Watch)
+    watch_status_file = env_cache_file("watch", selected_env)
+    if watch_status_file.exists():
+        try:
+            watch_status = json.loads(watch_status_file.read_text(encoding='utf-8-sig'))
+        except (OSError, ValueError):
+            watch_status = {}
+        # El pid descarta estados huérfanos (consola cerrada o proceso terminado)
+        if watch_process_alive(watch_status):
+            if watch_status.get("lastSyncLatencyMs") is not None:
+                st.info(
+                    f"👁️ Modo watch activo ({watch_status.get('mode')}) — última sincronización: "
+                    f"{watch_status['lastSyncLatencyMs'] / 1000:.1f} s desde el cambio hasta la subida "
+                    f"({watch_status.get('lastSyncFiles', 0)} archivos)"
+                )
+            else:
+                st.info(f"👁️ Modo watch activo ({watch_status.get('mode')}) — sin cambios todavía")
+    
     col1, col2 = st.columns(2)
     
     with col1:
@@ -275,7 +341,7 @@ if selected_env in config_data.get("environments", {}):
     
     # Vista previa JSON
     with st.expander("🔍 Ver JSON completo"):
-        st.json(config_data)
+        st.json(store.load())
 
 else:
     st.error("❌ Entorno no encontrado")
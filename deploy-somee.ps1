@@ -6,7 +6,11 @@ param(
     [string]$Env,
     
     [Parameter(Mandatory=$true)]
-    [string]$Password
+    [string]$Password,
+    
+    [switch]$Precompress,
+    
+    [switch]$Watch
 )
 
 $ErrorActionPreference = "Stop"
@@ -26,6 +30,9 @@ if (-not $envConfig) {
     exit 1
 }
 
+# Nombre del entorno apto para archivos en .deploy-cache (igual que deploy_settings.env_cache_file)
+$safeEnv = $Env -replace '[^A-Za-z0-9_.-]', '_'
+
 $ftpHost = $envConfig.ftpHost
 $ftpUser = $envConfig.ftpUser
 $remoteRoot = $envConfig.remoteRoot
@@ -80,6 +87,254 @@ if (-not (Test-Path $fullPublishPath)) {
 Write-Host "Ruta completa: $fullPublishPath" -ForegroundColor Gray
 Write-Host ""
 
+# Precompresion de estaticos (opcional): genera .gz/.br y deja fuera del
+# plan de subida los artefactos comprimidos que no cambiaron
+$precompressEnabled = $Precompress -or $envConfig.precompress -eq $true
+
+function Invoke-Precompression {
+    $manifestFile = Join-Path ([System.IO.Path]::GetTempPath()) "precompress-$([guid]::NewGuid()).json"
+    $precompressScript = Join-Path $PSScriptRoot "deploy_precompress.py"
+    try {
+        & python $precompressScript --publish-dir $fullPublishPath --env $Env --manifest $manifestFile | Out-Host
+        if ($LASTEXITCODE -ne 0) {
+            throw "codigo de salida $LASTEXITCODE"
+        }
+        return Get-Content $manifestFile -Raw -Encoding UTF8 | ConvertFrom-Json
+    }
+    catch {
+        Write-Host "AVISO: No se pudo precomprimir, se sube sin precompresion: $($_.Exception.Message)" -ForegroundColor Yellow
+        return $null
+    }
+    finally {
+        Remove-Item $manifestFile -ErrorAction SilentlyContinue
+    }
+}
+
+# Confirmar la cache solo si todo se subio; si no, la proxima vez se resube
+function Complete-Precompression {
+    param(
+        $manifest,
+        [bool]$succeeded
+    )
+    
+    if ($succeeded) {
+        Move-Item -Path $manifest.pendingCache -Destination $manifest.cacheFile -Force
+    } else {
+        Remove-Item $manifest.pendingCache -ErrorAction SilentlyContinue
+        Write-Host "  Cache de precompresion no actualizada por errores de subida" -ForegroundColor Yellow
+    }
+}
+
+$precompressCacheFile = Join-Path (Join-Path $PSScriptRoot ".deploy-cache") "precompress-$safeEnv.json"
+
+# Sin precompresion en esta pasada (desactivada o fallida): dotnet publish no
+# limpia los .gz/.br que se generaron antes y quedarian desfasados respecto a
+# sus originales. Se borran en local y se devuelven los artefactos registrados
+# (Artifacts, fuera del plan de subida) y los que estaban subidos (Stale)
+function Remove-PrecompressedLeftovers {
+    $leftovers = @{ Artifacts = @(); Stale = @() }
+    if (-not (Test-Path $precompressCacheFile)) {
+        return $leftovers
+    }
+    try {
+        $previousCache = Get-Content $precompressCacheFile -Raw -Encoding UTF8 | ConvertFrom-Json
+        foreach ($source in $previousCache.files.PSObject.Properties) {
+            foreach ($artifact in $source.Value.artifacts.PSObject.Properties) {
+                $relativeArtifact = "$($source.Name).$($artifact.Name)"
+                $leftovers.Artifacts += $relativeArtifact
+                if ($artifact.Value) {
+                    $leftovers.Stale += $relativeArtifact
+                }
+                Remove-Item -LiteralPath (Join-Path $fullPublishPath $relativeArtifact) -ErrorAction SilentlyContinue
+            }
+        }
+    }
+    catch {
+        Write-Host "AVISO: No se pudo leer la cache de precompresion: $($_.Exception.Message)" -ForegroundColor Yellow
+    }
+    return $leftovers
+}
+
+$skipArtifacts = New-Object 'System.Collections.Generic.HashSet[string]' ([System.StringComparer]::OrdinalIgnoreCase)
+$precompressManifest = $null
+$orphanPrecompressCache = $false
+# Artefactos .gz/.br subidos antes que ya no corresponden: se borran del servidor
+$staleArtifacts = @()
+if ($precompressEnabled) {
+    Write-Host "Precomprimiendo estaticos (.gz/.br)..." -ForegroundColor Yellow
+    $precompressManifest = Invoke-Precompression
+    if ($precompressManifest) {
+        foreach ($artifact in $precompressManifest.unchanged) {
+            [void]$skipArtifacts.Add($artifact)
+        }
+        $staleArtifacts = @($precompressManifest.removed)
+    }
+    Write-Host ""
+}
+if (-not $precompressManifest -and (Test-Path $precompressCacheFile)) {
+    $reason = if ($precompressEnabled) { "Precompresion fallida" } else { "Precompresion desactivada" }
+    Write-Host "${reason}: retirando artefactos .gz/.br anteriores..." -ForegroundColor Yellow
+    $orphanPrecompressCache = $true
+    $leftovers = Remove-PrecompressedLeftovers
+    foreach ($artifact in $leftovers.Artifacts) {
+        [void]$skipArtifacts.Add($artifact)
+    }
+    $staleArtifacts = @($leftovers.Stale)
+    Write-Host ""
+}
+
+# Limitador de ancho de banda (token bucket)
+#   environments.<env>.maxUploadBytesPerSec -> limite del entorno
+#   bandwidth.maxUploadBytesPerSec          -> limite global, repartido entre
+#                                              los deployments simultaneos
+# Ambos se releen de deploy-settings.json durante la subida (ajuste en vivo)
+$bandwidthDir = Join-Path (Join-Path $PSScriptRoot ".deploy-cache") "bandwidth"
+$leaseFile = Join-Path $bandwidthDir "$PID.lease"
+$script:bwClock = [System.Diagnostics.Stopwatch]::StartNew()
+$script:bwSettingsStamp = $null
+$script:bwEnvCap = 0.0
+$script:bwGlobalCap = 0.0
+$script:bwRate = 0.0
+$script:bwTokens = 0.0
+$script:bwLast = 0.0
+$script:bwNextRefresh = 0.0
+$script:bwBytes = 0
+# Segundos dentro del bucle de escritura (sin listados, MKD ni handshakes)
+$script:bwWriteSeconds = 0.0
+
+# Reparto max-min: quien pide menos que la parte igual se queda con lo suyo
+# y el sobrante se divide entre el resto (0 = sin limite propio)
+function Get-FairShare {
+    param(
+        [double]$capacity,
+        [double[]]$demands
+    )
+    
+    $remaining = $capacity
+    $left = $demands.Count
+    $sorted = $demands | Sort-Object { if ($_ -le 0) { [double]::MaxValue } else { $_ } }
+    foreach ($demand in $sorted) {
+        $share = $remaining / $left
+        if ($demand -le 0 -or $demand -ge $share) {
+            return $share
+        }
+        $remaining -= $demand
+        $left--
+    }
+    return $remaining
+}
+
+# Recalcula la tasa efectiva como mucho una vez por segundo
+function Update-BandwidthRate {
+    $now = $script:bwClock.Elapsed.TotalSeconds
+    if ($now -lt $script:bwNextRefresh) {
+        return
+    }
+    $script:bwNextRefresh = $now + 1.0
+    
+    try {
+        $stamp = (Get-Item $configFile).LastWriteTimeUtc
+        if ($stamp -ne $script:bwSettingsStamp) {
+            $liveConfig = Get-Content $configFile -Raw -Encoding UTF8 | ConvertFrom-Json
+            $script:bwEnvCap = [double]$liveConfig.environments.$Env.maxUploadBytesPerSec
+            $script:bwGlobalCap = [double]$liveConfig.bandwidth.maxUploadBytesPerSec
+            $script:bwSettingsStamp = $stamp
+        }
+    }
+    catch {
+        # JSON ilegible en este instante: se mantienen los limites actuales
+    }
+    
+    # Latido: cada deployment activo deja su demanda en un archivo .lease
+    try {
+        if (-not (Test-Path $bandwidthDir)) {
+            New-Item -ItemType Directory -Path $bandwidthDir -Force | Out-Null
+        }
+        [System.IO.File]::WriteAllText($leaseFile, [string]$script:bwEnvCap)
+    }
+    catch { }
+    
+    $rate = $script:bwEnvCap
+    if ($script:bwGlobalCap -gt 0) {
+        $demands = @()
+        $activeSince = [DateTime]::UtcNow.AddSeconds(-5)
+        $expiredBefore = [DateTime]::UtcNow.AddSeconds(-60)
+        foreach ($lease in Get-ChildItem -Path $bandwidthDir -Filter "*.lease" -ErrorAction SilentlyContinue) {
+            if ($lease.LastWriteTimeUtc -lt $expiredBefore) {
+                Remove-Item $lease.FullName -ErrorAction SilentlyContinue
+                continue
+            }
+            if ($lease.LastWriteTimeUtc -lt $activeSince) {
+                continue
+            }
+            try {
+                $demands += [double](Get-Content $lease.FullName -Raw)
+            }
+            catch {
+                $demands += 0.0
+            }
+        }
+        if ($demands.Count -eq 0) {
+            $demands = @($script:bwEnvCap)
+        }
+        $share = Get-FairShare -capacity $script:bwGlobalCap -demands $demands
+        if ($rate -le 0 -or $share -lt $rate) {
+            $rate = $share
+        }
+    }
+    $script:bwRate = $rate
+}
+
+# Tamano de bloque: ~50 ms de datos a la tasa actual (0 = archivo completo)
+function Get-UploadChunkSize {
+    if ($script:bwRate -le 0) {
+        return 0
+    }
+    return [int][math]::Max(16KB, [math]::Min(4MB, $script:bwRate / 20))
+}
+
+# Descuenta tokens y duerme solo si el cubo queda en deficit
+function Wait-UploadTokens {
+    param([int]$bytes)
+    
+    if ($script:bwRate -le 0) {
+        return
+    }
+    $now = $script:bwClock.Elapsed.TotalSeconds
+    $burst = $script:bwRate * 0.25
+    $script:bwTokens = [math]::Min($burst, $script:bwTokens + ($now - $script:bwLast) * $script:bwRate) - $bytes
+    $script:bwLast = $now
+    if ($script:bwTokens -lt 0) {
+        Start-Sleep -Milliseconds ([int][math]::Ceiling(-$script:bwTokens / $script:bwRate * 1000))
+    }
+}
+
+# Sesiones FTP: sin KeepAlive en el deployment normal; el modo watch las
+# mantiene abiertas (grupo de conexion propio) entre sincronizaciones
+$script:ftpKeepAlive = $false
+$script:ftpConnectionGroup = $null
+
+function New-FtpRequest {
+    param(
+        [string]$uri,
+        [string]$method,
+        [string]$username,
+        [string]$password,
+        [int]$timeout
+    )
+    
+    $request = [System.Net.FtpWebRequest]::Create($uri)
+    $request.Method = $method
+    $request.Credentials = New-Object System.Net.NetworkCredential($username, $password)
+    $request.UseBinary = $true
+    $request.KeepAlive = $script:ftpKeepAlive
+    if ($script:ftpConnectionGroup) {
+        $request.ConnectionGroupName = $script:ftpConnectionGroup
+    }
+    $request.Timeout = $timeout
+    return $request
+}
+
 # Funcion para crear directorio remoto
 function Ensure-RemoteDirectory {
     param(
@@ -90,12 +345,7 @@ function Ensure-RemoteDirectory {
     )
     
     try {
-        $request = [System.Net.FtpWebRequest]::Create($ftpUri + $remotePath)
-        $request.Method = [System.Net.WebRequestMethods+Ftp]::MakeDirectory
-        $request.Credentials = New-Object System.Net.NetworkCredential($username, $password)
-        $request.UseBinary = $true
-        $request.KeepAlive = $false
-        $request.Timeout = 30000
+        $request = New-FtpRequest -uri ($ftpUri + $remotePath) -method ([System.Net.WebRequestMethods+Ftp]::MakeDirectory) -username $username -password $password -timeout 30000
         
         $response = $request.GetResponse()
         $response.Close()
@@ -106,6 +356,50 @@ function Ensure-RemoteDirectory {
     }
 }
 
+# Funcion para borrar un archivo remoto (true tambien si ya no existia)
+function Remove-RemoteFile {
+    param(
+        [string]$ftpUri,
+        [string]$username,
+        [string]$password,
+        [string]$remotePath
+    )
+    
+    try {
+        $request = New-FtpRequest -uri ($ftpUri + $remotePath) -method ([System.Net.WebRequestMethods+Ftp]::DeleteFile) -username $username -password $password -timeout 30000
+        
+        $response = $request.GetResponse()
+        $response.Close()
+        return $true
+    }
+    catch {
+        $webException = $_.Exception
+        while ($webException -and -not ($webException -is [System.Net.WebException])) {
+            $webException = $webException.InnerException
+        }
+        if ($webException -and $webException.Response -and
+            $webException.Response.StatusCode -eq [System.Net.FtpStatusCode]::ActionNotTakenFileUnavailable) {
+            return $true
+        }
+        Write-Host "    ERROR al borrar: $($_.Exception.Message)" -ForegroundColor Red
+        return $false
+    }
+}
+
+# Borra del servidor los artefactos comprimidos obsoletos; devuelve los fallos
+function Remove-StaleArtifacts {
+    param([string[]]$paths)
+    
+    $failed = 0
+    foreach ($path in $paths) {
+        Write-Host "  Borrando: /$path" -ForegroundColor Yellow
+        if (-not (Remove-RemoteFile -ftpUri $ftpUri -username $ftpUser -password $Password -remotePath ($remoteRoot + "/" + $path))) {
+            $failed++
+        }
+    }
+    return $failed
+}
+
 # Funcion para subir archivo
 function Upload-File {
     param(
@@ -118,18 +412,27 @@ function Upload-File {
     
     try {
         $remoteUrl = $ftpUri + $remotePath
-        $request = [System.Net.FtpWebRequest]::Create($remoteUrl)
-        $request.Method = [System.Net.WebRequestMethods+Ftp]::UploadFile
-        $request.Credentials = New-Object System.Net.NetworkCredential($username, $password)
-        $request.UseBinary = $true
-        $request.KeepAlive = $false
-        $request.Timeout = 60000
+        $request = New-FtpRequest -uri $remoteUrl -method ([System.Net.WebRequestMethods+Ftp]::UploadFile) -username $username -password $password -timeout 60000
         
         $fileContent = [System.IO.File]::ReadAllBytes($localFile)
         $request.ContentLength = $fileContent.Length
         
         $requestStream = $request.GetRequestStream()
-        $requestStream.Write($fileContent, 0, $fileContent.Length)
+        $offset = 0
+        $writeStarted = $script:bwClock.Elapsed.TotalSeconds
+        while ($offset -lt $fileContent.Length) {
+            Update-BandwidthRate
+            $count = $fileContent.Length - $offset
+            $chunkSize = Get-UploadChunkSize
+            if ($chunkSize -gt 0 -and $chunkSize -lt $count) {
+                $count = $chunkSize
+            }
+            Wait-UploadTokens -bytes $count
+            $requestStream.Write($fileContent, $offset, $count)
+            $offset += $count
+            $script:bwBytes += $count
+        }
+        $script:bwWriteSeconds += $script:bwClock.Elapsed.TotalSeconds - $writeStarted
         $requestStream.Close()
         
         $response = $request.GetResponse()
@@ -170,6 +473,11 @@ function Upload-Directory {
         $relativePath = $file.FullName.Substring($baseLocalDir.Length).Replace("\", "/")
         $remotePath = $remoteDir + "/" + $file.Name
         
+        if ($script:skipArtifacts.Contains($relativePath.TrimStart("/"))) {
+            $script:skippedArtifacts++
+            continue
+        }
+        
         $fileSizeMB = [math]::Round($file.Length / 1MB, 2)
         Write-Host "[$fileCount] Subiendo: $relativePath ($fileSizeMB MB)" -ForegroundColor Yellow
         
@@ -177,6 +485,9 @@ function Upload-Directory {
         
         if ($success) {
             Write-Host "    OK" -ForegroundColor Green
+        } else {
+            $script:failedUploads++
+            $script:failedUploadPaths += $file.FullName
         }
     }
     
@@ -187,25 +498,475 @@ function Upload-Directory {
     }
 }
 
+# Foto (tamaño|mtime) de publishDir: base del modo watch
+function Get-PublishSnapshot {
+    $snapshot = New-Object 'System.Collections.Generic.Dictionary[string,string]' ([System.StringComparer]::OrdinalIgnoreCase)
+    $root = New-Object System.IO.DirectoryInfo $fullPublishPath
+    foreach ($file in $root.EnumerateFiles("*", [System.IO.SearchOption]::AllDirectories)) {
+        $snapshot[$file.FullName] = "$($file.Length)|$($file.LastWriteTimeUtc.Ticks)"
+    }
+    return ,$snapshot
+}
+
 # Iniciar subida
 $ftpUri = "ftp://$ftpHost"
 
 Write-Host "Subiendo archivos..." -ForegroundColor Cyan
 Write-Host ""
 
-Write-Host "Creando carpeta logs en el servidor..." -ForegroundColor Yellow
-Ensure-RemoteDirectory -ftpUri $ftpUri -username $ftpUser -password $Password -remotePath ($remoteRoot + "/logs") | Out-Null
+$script:skippedArtifacts = 0
+$script:failedUploads = 0
+$script:failedUploadPaths = @()
+# La base del modo watch se toma antes de subir: lo que dotnet publish
+# escriba durante la subida inicial se detecta despues como cambio
+if ($Watch) {
+    $script:watchSnapshot = Get-PublishSnapshot
+}
+$uploadWatch = [System.Diagnostics.Stopwatch]::StartNew()
 
-Upload-Directory -localDir $fullPublishPath -ftpUri $ftpUri -username $ftpUser -password $Password -remoteDir $remoteRoot -baseLocalDir $fullPublishPath
+try {
+    Write-Host "Creando carpeta logs en el servidor..." -ForegroundColor Yellow
+    Ensure-RemoteDirectory -ftpUri $ftpUri -username $ftpUser -password $Password -remotePath ($remoteRoot + "/logs") | Out-Null
+    
+    # Primero los .gz/.br obsoletos: nunca deben servirse junto a un original nuevo
+    if ($staleArtifacts.Count -gt 0) {
+        Write-Host "Borrando artefactos comprimidos obsoletos del servidor..." -ForegroundColor Yellow
+        $script:failedUploads += Remove-StaleArtifacts -paths $staleArtifacts
+    }
+    
+    Upload-Directory -localDir $fullPublishPath -ftpUri $ftpUri -username $ftpUser -password $Password -remoteDir $remoteRoot -baseLocalDir $fullPublishPath
+}
+finally {
+    $uploadWatch.Stop()
+    Remove-Item $leaseFile -ErrorAction SilentlyContinue
+}
 
 Write-Host ""
 Write-Host "========================================" -ForegroundColor Green
 Write-Host "  Deployment completado!" -ForegroundColor Green
 Write-Host "========================================" -ForegroundColor Green
 Write-Host "Archivos subidos exitosamente" -ForegroundColor Gray
+if ($script:failedUploads -gt 0) {
+    Write-Host "Archivos con error: $($script:failedUploads)" -ForegroundColor Red
+}
+
+$uploadSeconds = $uploadWatch.Elapsed.TotalSeconds
+$achievedKBs = if ($script:bwWriteSeconds -gt 0) { [math]::Round($script:bwBytes / 1KB / $script:bwWriteSeconds, 1) } else { 0 }
+$averageKBs = if ($uploadSeconds -gt 0) { [math]::Round($script:bwBytes / 1KB / $uploadSeconds, 1) } else { 0 }
+$envCapText = if ($script:bwEnvCap -gt 0) { "$([math]::Round($script:bwEnvCap / 1KB, 1)) KB/s" } else { "sin limite" }
+$globalCapText = if ($script:bwGlobalCap -gt 0) { "$([math]::Round($script:bwGlobalCap / 1KB, 1)) KB/s" } else { "sin limite" }
+Write-Host ""
+Write-Host "Ancho de banda:" -ForegroundColor Cyan
+Write-Host "  Transferido: $([math]::Round($script:bwBytes / 1MB, 2)) MB en $([math]::Round($uploadSeconds, 1)) s" -ForegroundColor Gray
+Write-Host "  Velocidad lograda (al escribir): $achievedKBs KB/s en $([math]::Round($script:bwWriteSeconds, 1)) s" -ForegroundColor Gray
+Write-Host "  Promedio de toda la subida: $averageKBs KB/s" -ForegroundColor Gray
+Write-Host "  Limite configurado: entorno $envCapText, global $globalCapText" -ForegroundColor Gray
+if ($script:bwRate -gt 0) {
+    Write-Host "  Tasa efectiva al finalizar: $([math]::Round($script:bwRate / 1KB, 1)) KB/s" -ForegroundColor Gray
+}
+
+if ($precompressManifest) {
+    $savedGz = [math]::Round($precompressManifest.bytesSaved.gz / 1MB, 2)
+    $savedBr = if ($precompressManifest.bytesSaved.br) { [math]::Round($precompressManifest.bytesSaved.br / 1MB, 2) } else { 0 }
+    Write-Host ""
+    Write-Host "Precompresion:" -ForegroundColor Cyan
+    Write-Host "  Artefactos nuevos subidos: $($precompressManifest.changed.Count)" -ForegroundColor Gray
+    Write-Host "  Artefactos sin cambios (omitidos): $($script:skippedArtifacts)" -ForegroundColor Gray
+    Write-Host "  Archivos donde no compensa: $($precompressManifest.skipped.Count)" -ForegroundColor Gray
+    Write-Host "  Artefactos obsoletos borrados: $($staleArtifacts.Count)" -ForegroundColor Gray
+    Write-Host "  Ahorro: gz $savedGz MB, br $savedBr MB" -ForegroundColor Gray
+    Write-Host "  Tiempo de compresion: $($precompressManifest.compressSeconds) s (CPU), $($precompressManifest.elapsedSeconds) s (total)" -ForegroundColor Gray
+    
+    Complete-Precompression -manifest $precompressManifest -succeeded ($script:failedUploads -eq 0)
+} elseif ($orphanPrecompressCache) {
+    Write-Host ""
+    Write-Host "Artefactos .gz/.br retirados del servidor: $($staleArtifacts.Count)" -ForegroundColor Gray
+    # Sin errores ya no queda nada que retirar; si los hubo se reintenta la proxima vez
+    if ($script:failedUploads -eq 0) {
+        Remove-Item $precompressCacheFile -ErrorAction SilentlyContinue
+    }
+}
 Write-Host ""
 Write-Host "IMPORTANTE:" -ForegroundColor Yellow
 Write-Host "  - Carpeta 'logs' creada en el servidor" -ForegroundColor Gray
 Write-Host "  - Revisar logs en el servidor si hay errores" -ForegroundColor Gray
 Write-Host "  - Asegurarse que .NET Runtime este instalado" -ForegroundColor Gray
 Write-Host ""
+
+# ========================================
+# Modo watch: sincronizacion continua
+# ========================================
+# Vigila publishDir (FileSystemWatcher: inotify en Linux, con sondeo como
+# respaldo), espera a que la salida de dotnet publish se asiente y sube solo
+# los archivos que cambiaron. El estado (incluida la latencia de la ultima
+# sincronizacion) se deja en .deploy-cache/watch-<env>.json para las UIs;
+# crear watch-<env>.stop detiene el modo watch.
+$watchBaseName = "watch-$safeEnv"
+$watchStatusFile = Join-Path (Join-Path $PSScriptRoot ".deploy-cache") "$watchBaseName.json"
+$watchStopFile = Join-Path (Join-Path $PSScriptRoot ".deploy-cache") "$watchBaseName.stop"
+$watchDebounceMs = if ($envConfig.watchDebounceMs) { [int]$envConfig.watchDebounceMs } else { 2000 }
+$watchPollSeconds = 5
+$watchKeepAliveSeconds = 60
+
+function Write-WatchStatus {
+    param([hashtable]$values)
+    
+    foreach ($key in $values.Keys) {
+        $script:watchStatus[$key] = $values[$key]
+    }
+    $script:watchStatus["updatedAt"] = [DateTime]::UtcNow.ToString("o")
+    try {
+        $statusDir = Split-Path $watchStatusFile -Parent
+        if (-not (Test-Path $statusDir)) {
+            New-Item -ItemType Directory -Path $statusDir -Force | Out-Null
+        }
+        $tmpFile = "$watchStatusFile.tmp"
+        [System.IO.File]::WriteAllText($tmpFile, ($script:watchStatus | ConvertTo-Json))
+        Move-Item -Path $tmpFile -Destination $watchStatusFile -Force
+    }
+    catch { }
+}
+
+# Sondeo: compara el arbol completo con la ultima foto subida (Changed) y
+# con el sondeo anterior (Moving): solo lo que sigue moviendose reinicia
+# la espera de asentamiento, si no un watchDebounceMs mayor que el intervalo
+# de sondeo no llegaria a cumplirse nunca
+function Get-SnapshotChanges {
+    $current = Get-PublishSnapshot
+    $changed = @()
+    $moving = @()
+    foreach ($entry in $current.GetEnumerator()) {
+        $previous = $null
+        if (-not $script:watchSnapshot.TryGetValue($entry.Key, [ref]$previous) -or $previous -ne $entry.Value) {
+            $changed += $entry.Key
+            $polled = $null
+            if (-not $script:lastPollSnapshot.TryGetValue($entry.Key, [ref]$polled) -or $polled -ne $entry.Value) {
+                $moving += $entry.Key
+            }
+        }
+    }
+    foreach ($path in @($script:watchSnapshot.Keys)) {
+        if (-not $current.ContainsKey($path)) {
+            [void]$script:watchSnapshot.Remove($path)
+        }
+    }
+    $script:lastPollSnapshot = $current
+    return @{ Changed = $changed; Moving = $moving }
+}
+
+# La salida se considera asentada si nada se escribio durante la ventana
+function Test-PathsSettled {
+    param([string[]]$paths)
+    
+    $threshold = [DateTime]::UtcNow.AddMilliseconds(-$watchDebounceMs)
+    foreach ($path in $paths) {
+        if ([System.IO.File]::Exists($path) -and [System.IO.File]::GetLastWriteTimeUtc($path) -gt $threshold) {
+            return $false
+        }
+    }
+    return $true
+}
+
+function Send-FtpKeepAlive {
+    try {
+        $request = New-FtpRequest -uri "ftp://$ftpHost/" -method ([System.Net.WebRequestMethods+Ftp]::PrintWorkingDirectory) -username $ftpUser -password $Password -timeout 30000
+        $response = $request.GetResponse()
+        $response.Close()
+    }
+    catch {
+        # Si el servidor cerro la sesion, la siguiente subida abre otra
+    }
+}
+
+function Invoke-WatchSync {
+    param(
+        [string[]]$paths,
+        [DateTime]$firstChangeUtc
+    )
+    
+    $candidates = New-Object 'System.Collections.Generic.Dictionary[string,System.IO.FileInfo]' ([System.StringComparer]::OrdinalIgnoreCase)
+    foreach ($path in $paths) {
+        if ([System.IO.Directory]::Exists($path)) {
+            # Carpeta nueva o renombrada: revisar todo su contenido
+            foreach ($file in (New-Object System.IO.DirectoryInfo $path).EnumerateFiles("*", [System.IO.SearchOption]::AllDirectories)) {
+                $candidates[$file.FullName] = $file
+            }
+        } elseif ([System.IO.File]::Exists($path)) {
+            $candidates[$path] = New-Object System.IO.FileInfo $path
+        } else {
+            # Borrado: el archivo remoto se conserva
+            [void]$script:watchSnapshot.Remove($path)
+        }
+    }
+    
+    $toUpload = @()
+    foreach ($file in $candidates.Values) {
+        $signature = "$($file.Length)|$($file.LastWriteTimeUtc.Ticks)"
+        $previous = $null
+        if (-not $script:watchSnapshot.TryGetValue($file.FullName, [ref]$previous) -or $previous -ne $signature) {
+            $toUpload += @{ File = $file; Signature = $signature }
+        }
+    }
+    
+    $manifest = $null
+    $precompressFailed = $false
+    $removedArtifacts = @()
+    if ($precompressEnabled -and $toUpload.Count -gt 0) {
+        $manifest = Invoke-Precompression
+        if ($manifest) {
+            $removedArtifacts = @($manifest.removed)
+            foreach ($artifact in $manifest.changed) {
+                $artifactFile = New-Object System.IO.FileInfo (Join-Path $fullPublishPath $artifact)
+                if (-not $candidates.ContainsKey($artifactFile.FullName)) {
+                    $toUpload += @{ File = $artifactFile; Signature = "$($artifactFile.Length)|$($artifactFile.LastWriteTimeUtc.Ticks)" }
+                }
+            }
+        } else {
+            # Igual que en la subida inicial: nada de .gz/.br desfasados
+            $precompressFailed = $true
+            $leftovers = Remove-PrecompressedLeftovers
+            $removedArtifacts = @($leftovers.Stale)
+            $leftoverSet = New-Object 'System.Collections.Generic.HashSet[string]' ([string[]]$leftovers.Artifacts, [System.StringComparer]::OrdinalIgnoreCase)
+            $toUpload = @($toUpload | Where-Object {
+                -not $leftoverSet.Contains($_.File.FullName.Substring($fullPublishPath.Length).Replace("\", "/").TrimStart("/"))
+            })
+        }
+    }
+    
+    if ($toUpload.Count -eq 0 -and $removedArtifacts.Count -eq 0) {
+        return @()
+    }
+    
+    Write-WatchStatus @{ state = "syncing" }
+    $failedPaths = @()
+    $bytesBefore = $script:bwBytes
+    $removeFailures = 0
+    if ($removedArtifacts.Count -gt 0) {
+        $removeFailures = Remove-StaleArtifacts -paths $removedArtifacts
+    }
+    foreach ($item in $toUpload) {
+        $file = $item.File
+        $relativePath = $file.FullName.Substring($fullPublishPath.Length).Replace("\", "/").TrimStart("/")
+        
+        # Crear las carpetas remotas que aun no se hayan visto en esta sesion
+        $segments = $relativePath.Split("/")
+        $remoteDir = $remoteRoot
+        for ($i = 0; $i -lt $segments.Length - 1; $i++) {
+            $remoteDir = $remoteDir + "/" + $segments[$i]
+            if ($script:watchRemoteDirs.Add($remoteDir)) {
+                Ensure-RemoteDirectory -ftpUri $ftpUri -username $ftpUser -password $Password -remotePath $remoteDir | Out-Null
+            }
+        }
+        
+        Write-Host "  Subiendo: $relativePath" -ForegroundColor Yellow
+        $remotePath = $remoteRoot + "/" + $relativePath
+        $success = Upload-File -localFile $file.FullName -ftpUri $ftpUri -username $ftpUser -password $Password -remotePath $remotePath
+        if (-not $success) {
+            # Un reintento: la sesion mantenida pudo haber caducado en el servidor
+            $success = Upload-File -localFile $file.FullName -ftpUri $ftpUri -username $ftpUser -password $Password -remotePath $remotePath
+        }
+        
+        if ($success) {
+            $script:watchSnapshot[$file.FullName] = $item.Signature
+        } else {
+            $failedPaths += $file.FullName
+        }
+    }
+    
+    if ($manifest) {
+        Complete-Precompression -manifest $manifest -succeeded ($failedPaths.Count -eq 0 -and $removeFailures -eq 0)
+    } elseif ($precompressFailed -and $removeFailures -eq 0) {
+        # Ya no quedan artefactos que retirar; la proxima pasada recomprime todo
+        Remove-Item $precompressCacheFile -ErrorAction SilentlyContinue
+    }
+    
+    $latencyMs = [math]::Round(([DateTime]::UtcNow - $firstChangeUtc).TotalMilliseconds)
+    $syncBytes = $script:bwBytes - $bytesBefore
+    $color = if ($failedPaths.Count -eq 0 -and $removeFailures -eq 0) { "Green" } else { "Red" }
+    Write-Host "[$(Get-Date -Format 'HH:mm:ss')] Sincronizados $($toUpload.Count - $failedPaths.Count) archivos ($([math]::Round($syncBytes / 1MB, 2)) MB), latencia $latencyMs ms" -ForegroundColor $color
+    
+    Write-WatchStatus @{
+        state = "watching"
+        lastSyncAt = [DateTime]::UtcNow.ToString("o")
+        lastSyncLatencyMs = $latencyMs
+        lastSyncFiles = $toUpload.Count - $failedPaths.Count
+        lastSyncBytes = $syncBytes
+        lastSyncErrors = $failedPaths.Count + $removeFailures
+        lastError = $null
+        syncCount = $script:watchStatus["syncCount"] + 1
+    }
+    return $failedPaths
+}
+
+function Start-WatchMode {
+    $script:ftpKeepAlive = $true
+    $script:ftpConnectionGroup = "watch-$Env-$PID"
+    $script:watchRemoteDirs = New-Object 'System.Collections.Generic.HashSet[string]' ([System.StringComparer]::OrdinalIgnoreCase)
+    $script:watchStatus = [ordered]@{
+        env = $Env
+        pid = $PID
+        state = "starting"
+        mode = $null
+        publishDir = $fullPublishPath
+        lastSyncAt = $null
+        lastSyncLatencyMs = $null
+        lastSyncFiles = 0
+        lastSyncBytes = 0
+        lastSyncErrors = 0
+        lastError = $null
+        syncCount = 0
+    }
+    Remove-Item $watchStopFile -ErrorAction SilentlyContinue
+    # Lo que fallo en la subida inicial no cuenta como subido
+    foreach ($path in $script:failedUploadPaths) {
+        [void]$script:watchSnapshot.Remove($path)
+    }
+    $script:lastPollSnapshot = New-Object 'System.Collections.Generic.Dictionary[string,string]' ($script:watchSnapshot, [System.StringComparer]::OrdinalIgnoreCase)
+    
+    $mode = if ($IsLinux) { "inotify" } else { "eventos" }
+    $watcher = $null
+    try {
+        $watcher = New-Object System.IO.FileSystemWatcher $fullPublishPath
+        $watcher.IncludeSubdirectories = $true
+        $watcher.InternalBufferSize = 64KB
+        $watcher.NotifyFilter = [System.IO.NotifyFilters]'FileName, DirectoryName, LastWrite, Size'
+        foreach ($eventName in "Changed", "Created", "Deleted", "Renamed", "Error") {
+            Register-ObjectEvent -InputObject $watcher -EventName $eventName -SourceIdentifier "PublishWatch.$eventName" | Out-Null
+        }
+        $watcher.EnableRaisingEvents = $true
+    }
+    catch {
+        Write-Host "AVISO: No se pudo vigilar con eventos ($($_.Exception.Message)); se usa sondeo cada $watchPollSeconds s" -ForegroundColor Yellow
+        $mode = "sondeo"
+        if ($watcher) {
+            $watcher.Dispose()
+            $watcher = $null
+        }
+        Get-EventSubscriber | Where-Object { $_.SourceIdentifier -like "PublishWatch.*" } | Unregister-Event
+    }
+    
+    $pending = New-Object 'System.Collections.Generic.HashSet[string]' ([System.StringComparer]::OrdinalIgnoreCase)
+    $firstChangeUtc = $null
+    $lastChangeUtc = $null
+    if ($script:failedUploadPaths.Count -gt 0) {
+        # Se reintentan en la primera ventana del modo watch
+        foreach ($path in $script:failedUploadPaths) {
+            [void]$pending.Add($path)
+        }
+        $firstChangeUtc = [DateTime]::UtcNow
+        $lastChangeUtc = $firstChangeUtc
+    }
+    $nextPollUtc = [DateTime]::UtcNow.AddSeconds($watchPollSeconds)
+    $lastActivityUtc = [DateTime]::UtcNow
+    
+    Write-Host ""
+    Write-Host "========================================" -ForegroundColor Cyan
+    Write-Host "  Modo watch ($mode) - $Env" -ForegroundColor Cyan
+    Write-Host "========================================" -ForegroundColor Cyan
+    Write-Host "Vigilando: $fullPublishPath" -ForegroundColor Gray
+    Write-Host "Espera de asentamiento: $watchDebounceMs ms" -ForegroundColor Gray
+    Write-Host "Ctrl+C (o Detener desde la UI) para salir" -ForegroundColor Gray
+    Write-Host ""
+    Write-WatchStatus @{ state = "watching"; mode = $mode }
+    
+    try {
+        while (-not (Test-Path $watchStopFile)) {
+            $paths = @()
+            try {
+                $fullRescan = $false
+                if ($watcher) {
+                    # Bloquea sin consumir CPU hasta que llegue un evento (o 1 s)
+                    if (Wait-Event -Timeout 1) {
+                        foreach ($evt in @(Get-Event)) {
+                            if ($evt.SourceIdentifier -eq "PublishWatch.Error") {
+                                # Desbordamiento del buffer: se pierde el detalle, comparar todo
+                                $fullRescan = $true
+                            } elseif ($evt.SourceIdentifier -like "PublishWatch.*") {
+                                [void]$pending.Add($evt.SourceEventArgs.FullPath)
+                                if (-not $firstChangeUtc) {
+                                    $firstChangeUtc = $evt.TimeGenerated.ToUniversalTime()
+                                }
+                                $lastChangeUtc = [DateTime]::UtcNow
+                            }
+                            Remove-Event -EventIdentifier $evt.EventIdentifier
+                        }
+                    }
+                } else {
+                    Start-Sleep -Seconds 1
+                    if ([DateTime]::UtcNow -ge $nextPollUtc) {
+                        $fullRescan = $true
+                        $nextPollUtc = [DateTime]::UtcNow.AddSeconds($watchPollSeconds)
+                    }
+                }
+                
+                if ($fullRescan) {
+                    $changes = Get-SnapshotChanges
+                    foreach ($path in $changes.Changed) {
+                        [void]$pending.Add($path)
+                        # Con sondeo el cambio real ocurrio al escribirse el archivo
+                        $writtenUtc = if ([System.IO.File]::Exists($path)) { [System.IO.File]::GetLastWriteTimeUtc($path) } else { [DateTime]::UtcNow }
+                        if (-not $firstChangeUtc -or $writtenUtc -lt $firstChangeUtc) {
+                            $firstChangeUtc = $writtenUtc
+                        }
+                    }
+                    if ($changes.Moving.Count -gt 0 -or ($pending.Count -gt 0 -and -not $lastChangeUtc)) {
+                        $lastChangeUtc = [DateTime]::UtcNow
+                    }
+                }
+                
+                if ($pending.Count -gt 0 -and ([DateTime]::UtcNow - $lastChangeUtc).TotalMilliseconds -ge $watchDebounceMs) {
+                    $paths = @($pending)
+                    if (Test-PathsSettled -paths $paths) {
+                        $pending.Clear()
+                        $failedPaths = @(Invoke-WatchSync -paths $paths -firstChangeUtc $firstChangeUtc)
+                        if ($failedPaths.Count -gt 0) {
+                            # Reintentar en la siguiente ventana conservando el inicio de la rafaga
+                            foreach ($path in $failedPaths) {
+                                [void]$pending.Add($path)
+                            }
+                            $lastChangeUtc = [DateTime]::UtcNow
+                        } else {
+                            $firstChangeUtc = $null
+                        }
+                        $lastActivityUtc = [DateTime]::UtcNow
+                    } else {
+                        $lastChangeUtc = [DateTime]::UtcNow
+                    }
+                }
+                
+                if (([DateTime]::UtcNow - $lastActivityUtc).TotalSeconds -ge $watchKeepAliveSeconds) {
+                    Send-FtpKeepAlive
+                    $lastActivityUtc = [DateTime]::UtcNow
+                }
+            }
+            catch {
+                # Un fallo puntual (FTP, disco, Python) no debe terminar el watch:
+                # se registra y los cambios se reintentan en la siguiente ventana
+                Write-Host "[$(Get-Date -Format 'HH:mm:ss')] ERROR en la sincronizacion: $($_.Exception.Message)" -ForegroundColor Red
+                foreach ($path in $paths) {
+                    [void]$pending.Add($path)
+                }
+                if ($pending.Count -gt 0) {
+                    $lastChangeUtc = [DateTime]::UtcNow
+                }
+                Write-WatchStatus @{ state = "watching"; lastError = $_.Exception.Message }
+                Start-Sleep -Seconds 1
+            }
+        }
+    }
+    finally {
+        if ($watcher) {
+            $watcher.EnableRaisingEvents = $false
+            $watcher.Dispose()
+        }
+        Get-EventSubscriber | Where-Object { $_.SourceIdentifier -like "PublishWatch.*" } | Unregister-Event
+        Remove-Item $watchStopFile -ErrorAction SilentlyContinue
+        Remove-Item $leaseFile -ErrorAction SilentlyContinue
+        Write-WatchStatus @{ state = "stopped" }
+        Write-Host "Modo watch detenido" -ForegroundColor Gray
+    }
+}
+
+if ($Watch) {
+    Start-WatchMode
+}
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Precompresión de estáticos (wwwroot) antes del deployment
+Genera hermanos .gz y .br en paralelo y recuerda qué se comprimió para
+que solo los artefactos que cambiaron entren en el plan de subida
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from deploy_settings import CACHE_DIR, env_cache_file
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin brotli solo se generan .gz
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".js", ".mjs", ".css", ".json", ".map", ".html", ".htm",
+    ".svg", ".xml", ".txt", ".csv", ".wasm", ".ttf", ".otf", ".eot"
+}
+ENCODINGS = ("gz", "br")
+MIN_SIZE = 1024          # Por debajo de esto la cabecera se come la ganancia
+MAX_RATIO = 0.9          # Solo se guarda si reduce al menos un 10%
+CACHE_VERSION = 1
+
+
+def _compress(data, encoding):
+    if encoding == "gz":
+        # mtime=0 para que el mismo contenido produzca siempre los mismos bytes
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def _write_atomic(path, data):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def process_asset(job):
+    """Hashea y, si hace falta, comprime un archivo (se ejecuta en el pool)"""
+    path, previous_sha, encodings = job
+    path = Path(path)
+    started = time.perf_counter()
+
+    data = path.read_bytes()
+    sha256 = hashlib.sha256(data).hexdigest()
+    result = {"sha256": sha256, "size": len(data), "artifacts": {}, "changed": [], "seconds": 0.0}
+
+    for encoding in encodings:
+        sibling = path.with_name(f"{path.name}.{encoding}")
+        if sha256 == previous_sha.get(encoding) and sibling.exists():
+            # Mismo contenido y artefacto presente: no se recomprime
+            result["artifacts"][encoding] = sibling.stat().st_size
+            continue
+
+        compressed = _compress(data, encoding)
+        if len(compressed) > len(data) * MAX_RATIO:
+            if sibling.exists():
+                sibling.unlink()
+            result["artifacts"][encoding] = None
+            continue
+
+        _write_atomic(sibling, compressed)
+        result["artifacts"][encoding] = len(compressed)
+        result["changed"].append(encoding)
+
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+class Precompressor:
+    """Etapa de precompresión con caché por entorno
+
+    La caché guarda, por archivo, tamaño/mtime/sha256 del original y el
+    tamaño de cada artefacto. Si tamaño y mtime no cambian no se lee el
+    archivo; si cambian se compara el sha256 (dotnet publish reescribe todo
+    aunque el contenido sea idéntico) y solo se recomprime lo distinto.
+    """
+
+    def __init__(self, publish_dir, env_name, cache_dir=CACHE_DIR,
+                 root="wwwroot", workers=None):
+        self.publish_dir = Path(publish_dir)
+        self.root = self.publish_dir / root if root else self.publish_dir
+        self.encodings = tuple(e for e in ENCODINGS if e != "br" or brotli is not None)
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_file = env_cache_file("precompress", env_name, cache_dir=cache_dir)
+
+    def load_cache(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        if cache.get("version") != CACHE_VERSION or cache.get("root") != str(self.root):
+            return {}
+        return cache.get("files", {})
+
+    def scan(self):
+        """Archivos comprimibles bajo root: {ruta relativa: os.stat_result}"""
+        assets = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if os.path.splitext(filename)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                    continue
+                full_path = Path(dirpath) / filename
+                stat = full_path.stat()
+                if stat.st_size >= MIN_SIZE:
+                    assets[full_path.relative_to(self.publish_dir).as_posix()] = stat
+        return assets
+
+    def run(self):
+        started = time.perf_counter()
+        cached_files = self.load_cache()
+        assets = self.scan() if self.root.is_dir() else {}
+
+        new_cache = {}
+        jobs = []
+        for rel_path, stat in assets.items():
+            entry = cached_files.get(rel_path)
+            full_path = self.publish_dir / rel_path
+            if (entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                    and self._artifacts_present(full_path, entry)):
+                # Sin codificaciones que ya no se generan (p. ej. brotli desinstalado)
+                new_cache[rel_path] = dict(entry, artifacts={
+                    enc: size for enc, size in entry["artifacts"].items() if enc in self.encodings
+                })
+                continue
+            previous_sha = {}
+            if entry:
+                previous_sha = {enc: entry["sha256"] for enc in self.encodings
+                                if entry.get("artifacts", {}).get(enc)}
+            jobs.append((rel_path, stat, (str(full_path), previous_sha, self.encodings)))
+
+        changed, compress_seconds = [], 0.0
+        if jobs:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(jobs))) as pool:
+                results = pool.map(process_asset, [job for _, _, job in jobs],
+                                   chunksize=max(1, len(jobs) // (self.workers * 4)))
+                for (rel_path, stat, _), result in zip(jobs, results):
+                    new_cache[rel_path] = {
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "sha256": result["sha256"],
+                        "artifacts": result["artifacts"]
+                    }
+                    changed.extend(f"{rel_path}.{enc}" for enc in result["changed"])
+                    compress_seconds += result["seconds"]
+
+        removed = self._remove_stale(cached_files, new_cache)
+        report = self._report(new_cache, changed, compress_seconds, time.perf_counter() - started)
+        report["removed"] = removed
+        return report
+
+    def _remove_stale(self, cached_files, new_cache):
+        """Artefactos que estaban subidos y ya no corresponden
+
+        Casos: el original se borró o quedó bajo MIN_SIZE, su compresión dejó
+        de compensar o la codificación ya no se genera. Se borran en local y
+        se devuelven para que el script los borre también en el servidor.
+        """
+        removed = []
+        for rel_path, entry in cached_files.items():
+            current = new_cache.get(rel_path, {}).get("artifacts", {})
+            for encoding, size in entry.get("artifacts", {}).items():
+                if current.get(encoding):
+                    continue
+                sibling = self.publish_dir / f"{rel_path}.{encoding}"
+                if sibling.exists():
+                    sibling.unlink()
+                if size:
+                    removed.append(f"{rel_path}.{encoding}")
+        return sorted(removed)
+
+    def _artifacts_present(self, full_path, entry):
+        artifacts = entry.get("artifacts", {})
+        for encoding in self.encodings:
+            if encoding not in artifacts:
+                return False
+            if artifacts[encoding] and not full_path.with_name(f"{full_path.name}.{encoding}").exists():
+                return False
+        return True
+
+    def _report(self, new_cache, changed, compress_seconds, elapsed):
+        artifacts, skipped = [], []
+        original_bytes = 0
+        saved = {enc: 0 for enc in self.encodings}
+        for rel_path, entry in new_cache.items():
+            produced = False
+            for encoding in self.encodings:
+                size = entry["artifacts"].get(encoding)
+                if size:
+                    produced = True
+                    artifacts.append(f"{rel_path}.{encoding}")
+                    saved[encoding] += entry["size"] - size
+            if produced:
+                original_bytes += entry["size"]
+            else:
+                skipped.append(rel_path)
+
+        changed_set = set(changed)
+        return {
+            "cache": {"version": CACHE_VERSION, "root": str(self.root), "files": new_cache},
+            "encodings": list(self.encodings),
+            "changed": sorted(changed_set),
+            "unchanged": sorted(a for a in artifacts if a not in changed_set),
+            "skipped": sorted(skipped),
+            "originalBytes": original_bytes,
+            "bytesSaved": saved,
+            "compressSeconds": round(compress_seconds, 3),
+            "elapsedSeconds": round(elapsed, 3)
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precomprime los estáticos de publishDir (.gz/.br)")
+    parser.add_argument("--publish-dir", required=True, help="Directorio con la publicación")
+    parser.add_argument("--env", required=True, help="Entorno de destino (la caché es por entorno)")
+    parser.add_argument("--manifest", required=True, help="Archivo JSON con el plan resultante")
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR))
+    parser.add_argument("--root", default="wwwroot", help="Subcarpeta con los estáticos")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    precompressor = Precompressor(args.publish_dir, args.env, args.cache_dir, args.root, args.workers)
+    if not precompressor.root.is_dir():
+        print(f"No existe {precompressor.root}; no hay estáticos que precomprimir")
+
+    report = precompressor.run()
+
+    # La caché queda pendiente: el script de deployment la confirma solo si
+    # la subida termina sin errores, para no dar por subido lo que falló
+    cache_file = precompressor.cache_file
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    pending_file = cache_file.with_name(cache_file.name + ".pending")
+    with open(pending_file, 'w', encoding='utf-8') as f:
+        json.dump(report.pop("cache"), f)
+    report["pendingCache"] = str(pending_file)
+    report["cacheFile"] = str(cache_file)
+
+    with open(args.manifest, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    saved_mb = {enc: round(size / 1024 / 1024, 2) for enc, size in report["bytesSaved"].items()}
+    print(f"Precompresion ({', '.join(report['encodings'])}): "
+          f"{len(report['changed'])} artefactos nuevos, {len(report['unchanged'])} sin cambios, "
+          f"{len(report['skipped'])} omitidos (no compensa), {len(report['removed'])} a borrar")
+    print("  Ahorro: " + ", ".join(f"{enc} {mb} MB" for enc, mb in saved_mb.items())
+          + f" sobre {round(report['originalBytes'] / 1024 / 1024, 2)} MB")
+    print(f"  Tiempo: {report['compressSeconds']} s de CPU, {report['elapsedSeconds']} s total")
+    if brotli is None:
+        print("  (instala 'brotli' para generar tambien .br)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
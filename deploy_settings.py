@@ -0,0 +1,267 @@
+"""
+Almacén compartido de deploy-settings.json
+Lo usan tanto la UI de escritorio como la UI web: escrituras atómicas
+protegidas con lock y caché validada por mtime
+"""
+
+import copy
+import json
+import os
+import re
+import stat
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+if os.name == "nt":
+    import ctypes
+    import msvcrt
+else:
+    import fcntl
+
+DEFAULT_CONFIG_FILE = Path(__file__).parent / "deploy-settings.json"
+CACHE_DIR = Path(__file__).parent / ".deploy-cache"
+
+
+def env_cache_file(prefix, env_name, suffix=".json", cache_dir=CACHE_DIR):
+    """Archivo por entorno en .deploy-cache (mismo saneado que deploy-somee.ps1)"""
+    safe_env = re.sub(r"[^A-Za-z0-9_.-]", "_", env_name)
+    return Path(cache_dir) / f"{prefix}-{safe_env}{suffix}"
+
+
+def pid_alive(pid):
+    """True si existe un proceso con ese pid"""
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    if os.name == "nt":
+        # os.kill(pid, 0) en Windows no comprueba nada: lo termina
+        process_query_limited_information = 0x1000
+        still_active = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return False
+            return exit_code.value == still_active
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def watch_process_alive(status):
+    """True si watch-<env>.json describe un modo watch que sigue corriendo
+
+    El estado queda en "watching" si la consola se cerró o el proceso se
+    terminó a la fuerza, así que además se comprueba que el pid exista.
+    """
+    if not status or status.get("state") not in ("starting", "watching", "syncing"):
+        return False
+    return pid_alive(status.get("pid"))
+
+
+class SettingsStore:
+    """Acceso concurrente a deploy-settings.json
+
+    La lectura se cachea y solo se repite cuando cambia el mtime/tamaño del
+    archivo, de modo que las ediciones hechas desde la otra UI (o a mano) se
+    ven en la siguiente consulta. Las escrituras se hacen por entorno: bajo
+    el lock se relee el archivo, se aplica el cambio y se reemplaza de forma
+    atómica, así un guardado nunca pisa los entornos editados por otro proceso.
+    """
+
+    def __init__(self, config_file=DEFAULT_CONFIG_FILE):
+        self.config_file = Path(config_file)
+        self.lock_file = self.config_file.with_name(self.config_file.name + ".lock")
+        self._thread_lock = threading.RLock()
+        self._data = None
+        self._stamp = None
+        self._names = ()
+        # Fragmentos JSON ya serializados por entorno: {nombre: (config, texto)}
+        self._fragments = {}
+
+    # ------------------------------------------------------------------ lectura
+
+    def _file_stamp(self):
+        try:
+            file_stat = self.config_file.stat()
+        except FileNotFoundError:
+            return None
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+
+    def _read_file(self):
+        if not self.config_file.exists():
+            return {"environments": {}}
+        with open(self.config_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        data.setdefault("environments", {})
+        return data
+
+    def _current(self):
+        """Devuelve los datos cacheados, releyendo solo si el archivo cambió"""
+        stamp = self._file_stamp()
+        if self._data is None or stamp != self._stamp:
+            self._data = self._read_file()
+            self._stamp = stamp
+            self._names = tuple(self._data["environments"].keys())
+        return self._data
+
+    def stamp(self):
+        """Marca (mtime, tamaño) del archivo: barata para detectar cambios externos"""
+        return self._file_stamp()
+
+    def load(self):
+        """Copia completa de la configuración (para vistas previas o exportar)"""
+        with self._thread_lock:
+            return copy.deepcopy(self._current())
+
+    def environment_names(self):
+        """Nombres de los entornos en el orden del archivo"""
+        with self._thread_lock:
+            self._current()
+            return list(self._names)
+
+    def get_environment(self, name):
+        """Copia de la configuración de un entorno ({} si no existe)"""
+        with self._thread_lock:
+            return dict(self._current()["environments"].get(name, {}))
+
+    def get_section(self, name):
+        """Copia de una sección de nivel superior, p. ej. "bandwidth" ({} si no existe)"""
+        with self._thread_lock:
+            return copy.deepcopy(self._current().get(name, {}))
+
+    # ---------------------------------------------------------------- escritura
+
+    def update_section(self, name, values):
+        """Crea o actualiza una sección de nivel superior conservando sus otras claves"""
+        if name == "environments":
+            raise ValueError("Usa update_environment para modificar entornos")
+        with self._locked():
+            data = self._current()
+            data.setdefault(name, {}).update(values)
+            self._write(data)
+
+    def update_environment(self, name, values):
+        """Crea o actualiza un entorno, conservando las claves no indicadas"""
+        with self._locked():
+            data = self._current()
+            data["environments"].setdefault(name, {}).update(values)
+            self._write(data)
+
+    def delete_environment(self, name):
+        """Elimina un entorno; devuelve False si ya no existía"""
+        with self._locked():
+            data = self._current()
+            if name not in data["environments"]:
+                return False
+            del data["environments"][name]
+            self._fragments.pop(name, None)
+            self._write(data)
+            return True
+
+    @contextmanager
+    def _locked(self):
+        """Lock entre hilos y entre procesos (archivo .lock junto al JSON)"""
+        with self._thread_lock:
+            with open(self.lock_file, 'a+b') as fh:
+                if os.name == "nt":
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+                else:
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+                try:
+                    # Forzar relectura: otro proceso pudo escribir en el mismo
+                    # tick de mtime mientras esperábamos el lock
+                    self._data = None
+                    yield
+                except BaseException:
+                    # No dejar en caché un cambio que no llegó al disco
+                    self._data = None
+                    raise
+                finally:
+                    if os.name == "nt":
+                        fh.seek(0)
+                        msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+                    else:
+                        fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def _render(self, data):
+        """Serializa igual que json.dump(indent=2), reutilizando fragmentos"""
+        parts = []
+        for key, value in data.items():
+            if key == "environments":
+                text = self._render_environments(value)
+            else:
+                text = json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+            parts.append(f"  {json.dumps(key, ensure_ascii=False)}: {text}")
+        if not parts:
+            return "{}"
+        return "{\n" + ",\n".join(parts) + "\n}"
+
+    def _render_environments(self, environments):
+        if not environments:
+            return "{}"
+        entries = []
+        for name, env_config in environments.items():
+            cached = self._fragments.get(name)
+            if cached is None or cached[0] != env_config:
+                text = json.dumps(env_config, indent=2, ensure_ascii=False).replace("\n", "\n    ")
+                cached = (copy.deepcopy(env_config), text)
+                self._fragments[name] = cached
+            entries.append(f"    {json.dumps(name, ensure_ascii=False)}: {cached[1]}")
+        return "{\n" + ",\n".join(entries) + "\n  }"
+
+    def _write(self, data):
+        """Escritura atómica: archivo temporal en el mismo directorio + replace"""
+        content = self._render(data)
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=self.config_file.name + ".",
+            suffix=".tmp",
+            dir=self.config_file.parent
+        )
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            # mkstemp crea el temporal con 0600: conservar los permisos del
+            # archivo actual para que la UI web o el script (otro usuario) lo lean
+            os.chmod(tmp_path, self._target_mode())
+            # En Windows el replace falla si otro proceso (p. ej. PowerShell)
+            # tiene el archivo abierto justo en ese instante: reintentar
+            for attempt in range(10):
+                try:
+                    os.replace(tmp_path, self.config_file)
+                    break
+                except PermissionError:
+                    if attempt == 9:
+                        raise
+                    time.sleep(0.05)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._data = data
+        self._stamp = self._file_stamp()
+        self._names = tuple(data["environments"].keys())
+
+    def _target_mode(self):
+        """Permisos del archivo existente, o los por defecto según la umask"""
+        try:
+            return stat.S_IMODE(self.config_file.stat().st_mode)
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            return 0o666 & ~umask
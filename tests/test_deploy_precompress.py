@@ -0,0 +1,81 @@
+import json
+import os
+
+import deploy_precompress
+from deploy_precompress import Precompressor
+
+COMPRESSIBLE = b"body { color: red; margin: 0; padding: 0; }\n" * 200
+
+
+def run_and_commit(publish_dir, cache_dir):
+    """Una pasada completa con la caché confirmada, como tras un deployment sin errores"""
+    precompressor = Precompressor(publish_dir, "somee", cache_dir=cache_dir, workers=1)
+    report = precompressor.run()
+    precompressor.cache_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(precompressor.cache_file, 'w', encoding='utf-8') as f:
+        json.dump(report.pop("cache"), f)
+    return report
+
+
+def test_unchanged_size_and_mtime_is_not_read(tmp_path, monkeypatch):
+    publish_dir = tmp_path / "publish"
+    (publish_dir / "wwwroot").mkdir(parents=True)
+    (publish_dir / "wwwroot" / "site.css").write_bytes(COMPRESSIBLE)
+    run_and_commit(publish_dir, tmp_path / "cache")
+
+    class NoPool:
+        def __init__(self, *args, **kwargs):
+            raise AssertionError("no debería hashear ni comprimir nada")
+
+    monkeypatch.setattr(deploy_precompress, "ProcessPoolExecutor", NoPool)
+    report = run_and_commit(publish_dir, tmp_path / "cache")
+
+    assert report["changed"] == []
+    assert "wwwroot/site.css.gz" in report["unchanged"]
+
+
+def test_new_mtime_with_same_content_is_not_recompressed(tmp_path):
+    publish_dir = tmp_path / "publish"
+    (publish_dir / "wwwroot").mkdir(parents=True)
+    source = publish_dir / "wwwroot" / "site.css"
+    source.write_bytes(COMPRESSIBLE)
+    run_and_commit(publish_dir, tmp_path / "cache")
+    sibling = publish_dir / "wwwroot" / "site.css.gz"
+    sibling_mtime = sibling.stat().st_mtime_ns
+
+    # dotnet publish reescribe el archivo con el mismo contenido
+    source_stat = source.stat()
+    os.utime(source, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns + 10**9))
+    report = run_and_commit(publish_dir, tmp_path / "cache")
+
+    assert report["changed"] == []
+    assert "wwwroot/site.css.gz" in report["unchanged"]
+    assert sibling.stat().st_mtime_ns == sibling_mtime
+
+
+def test_incompressible_file_writes_no_sibling(tmp_path):
+    publish_dir = tmp_path / "publish"
+    (publish_dir / "wwwroot").mkdir(parents=True)
+    (publish_dir / "wwwroot" / "data.json").write_bytes(os.urandom(8192))
+
+    report = run_and_commit(publish_dir, tmp_path / "cache")
+
+    assert report["skipped"] == ["wwwroot/data.json"]
+    assert report["changed"] == []
+    assert not (publish_dir / "wwwroot" / "data.json.gz").exists()
+
+
+def test_deleted_source_removes_its_sibling(tmp_path):
+    publish_dir = tmp_path / "publish"
+    (publish_dir / "wwwroot").mkdir(parents=True)
+    source = publish_dir / "wwwroot" / "app.js"
+    source.write_bytes(COMPRESSIBLE)
+    run_and_commit(publish_dir, tmp_path / "cache")
+    sibling = publish_dir / "wwwroot" / "app.js.gz"
+    assert sibling.exists()
+
+    source.unlink()
+    report = run_and_commit(publish_dir, tmp_path / "cache")
+
+    assert "wwwroot/app.js.gz" in report["removed"]
+    assert not sibling.exists()
@@ -0,0 +1,112 @@
+import json
+import os
+import stat
+import subprocess
+import sys
+
+import pytest
+
+import deploy_settings
+from deploy_settings import SettingsStore, watch_process_alive
+
+
+def write_settings(path, data):
+    path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
+
+
+def test_output_matches_json_dump(tmp_path):
+    config_file = tmp_path / "deploy-settings.json"
+    data = {
+        "environments": {
+            "somee": {"publishDir": "D:\\pub", "ftpHost": "h", "ftpUser": "ñandú", "remoteRoot": "/"}
+        },
+        "bandwidth": {"maxUploadBytesPerSec": 1024, "extra": [1, {"a": None}]}
+    }
+    write_settings(config_file, data)
+
+    store = SettingsStore(config_file)
+    store.update_environment("prod", {"ftpHost": "ftp.example.com", "precompress": True})
+    store.update_environment("somee", {"remoteRoot": "/www"})
+
+    data["environments"]["prod"] = {"ftpHost": "ftp.example.com", "precompress": True}
+    data["environments"]["somee"]["remoteRoot"] = "/www"
+    assert config_file.read_text(encoding='utf-8') == json.dumps(data, indent=2, ensure_ascii=False)
+
+
+def test_empty_environments_match_json_dump(tmp_path):
+    config_file = tmp_path / "deploy-settings.json"
+    store = SettingsStore(config_file)
+    store.update_environment("a", {})
+    store.delete_environment("a")
+
+    assert config_file.read_text(encoding='utf-8') == json.dumps({"environments": {}}, indent=2)
+
+
+def test_concurrent_updates_from_two_stores_keep_both(tmp_path):
+    config_file = tmp_path / "deploy-settings.json"
+    write_settings(config_file, {"environments": {"somee": {"ftpHost": "h"}}})
+
+    desktop = SettingsStore(config_file)
+    web = SettingsStore(config_file)
+    # Ambas instancias tienen la misma foto en caché antes de guardar
+    assert desktop.environment_names() == web.environment_names() == ["somee"]
+
+    desktop.update_environment("dev", {"ftpHost": "dev.example.com"})
+    web.update_environment("prod", {"ftpHost": "prod.example.com"})
+
+    saved = json.loads(config_file.read_text(encoding='utf-8'))
+    assert list(saved["environments"]) == ["somee", "dev", "prod"]
+    assert desktop.environment_names() == ["somee", "dev", "prod"]
+
+
+def test_external_edit_is_seen(tmp_path):
+    config_file = tmp_path / "deploy-settings.json"
+    write_settings(config_file, {"environments": {"somee": {}}})
+    store = SettingsStore(config_file)
+    stamp = store.stamp()
+    assert store.environment_names() == ["somee"]
+
+    write_settings(config_file, {"environments": {"somee": {}, "nuevo": {"ftpHost": "x"}}})
+    assert store.stamp() != stamp
+    assert store.environment_names() == ["somee", "nuevo"]
+
+
+def test_failed_write_clears_cache(tmp_path, monkeypatch):
+    config_file = tmp_path / "deploy-settings.json"
+    write_settings(config_file, {"environments": {"somee": {"ftpHost": "h"}}})
+    store = SettingsStore(config_file)
+    assert store.environment_names() == ["somee"]
+
+    def failing_replace(src, dst):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(deploy_settings.os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        store.update_environment("dev", {"ftpHost": "dev.example.com"})
+    monkeypatch.undo()
+
+    assert store.environment_names() == ["somee"]
+    assert store.get_environment("dev") == {}
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
+
+
+@pytest.mark.skipif(os.name == "nt", reason="permisos POSIX")
+def test_write_keeps_file_mode(tmp_path):
+    config_file = tmp_path / "deploy-settings.json"
+    write_settings(config_file, {"environments": {}})
+    os.chmod(config_file, 0o664)
+
+    SettingsStore(config_file).update_environment("somee", {"ftpHost": "h"})
+
+    assert stat.S_IMODE(config_file.stat().st_mode) == 0o664
+
+
+def test_watch_status_needs_live_pid():
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+
+    assert watch_process_alive({"state": "watching", "pid": os.getpid()})
+    assert not watch_process_alive({"state": "stopped", "pid": os.getpid()})
+    assert not watch_process_alive({"state": "watching", "pid": finished.pid})
+    assert not watch_process_alive({"state": "watching"})
+    assert not watch_process_alive(None)